@@ -6,44 +6,49 @@
 
 import os
 import re
+import importlib.util
+import json
 import sys
 import time
 import shutil
 import asyncio
+import contextlib
 import textwrap
 import subprocess
+import tempfile
+import threading
+import atexit
+from collections import deque
+from fractions import Fraction
 from pathlib import Path
-from typing import Optional, List, Tuple
-from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict, Union, Iterable, Iterator
+from dataclasses import dataclass, field, replace
 
 # ===== DEPENDENCY CHECKER =====
-def install_requirements():
-    reqs = ["rich", "questionary", "fonttools"]
-    missing = []
-    for pkg in reqs:
-        try:
-            __import__(pkg)
-        except ImportError:
-            missing.append(pkg)
+# Import name -> pip package name
+REQUIREMENTS = {"rich": "rich", "questionary": "questionary", "fontTools": "fonttools"}
+
+def install_requirements(modules: Tuple[str, ...] = ("rich", "questionary"), restart: bool = True):
+    # find_spec only asks the import finders; the package bodies run once, at the real imports
+    missing = [REQUIREMENTS[mod] for mod in modules if importlib.util.find_spec(mod) is None]
     
     if missing:
         print(f"Installing missing libraries: {', '.join(missing)}...")
         subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
-        print("Done. Restarting...")
-        os.execv(sys.executable, ['python'] + sys.argv)
-
-try:
-    from rich.console import Console
-    from rich.panel import Panel
-    from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn
-    from rich.theme import Theme
-    from rich.align import Align
-    from rich.markup import escape  # <--- FIX 3: IMPORT ESCAPE
-    import questionary
-    from questionary import Style
-    from fontTools.ttLib import TTFont
-except ImportError:
-    install_requirements()
+        if restart:
+            print("Done. Restarting...")
+            os.execv(sys.executable, ['python'] + sys.argv)
+        importlib.invalidate_caches()  # lazy call sites import right after installing, no restart
+
+install_requirements()
+from rich.console import Console
+from rich.panel import Panel
+from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn
+from rich.theme import Theme
+from rich.align import Align
+from rich.markup import escape  # <--- FIX 3: IMPORT ESCAPE
+import questionary
+from questionary import Style
 
 # ===== CONFIGURATION =====
 BASE_PATH = Path.home() / "storage" / "shared" / "FFmpegBot"
@@ -54,6 +59,15 @@ DIRECTORIES = {
     "FONTS": BASE_PATH / "Fonts",
     "LOGOS": BASE_PATH / "Logos"
 }
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi')
+# Menu label -> JobConfig.mode
+MODE_MAP = {"Hardsub (SRT)": "hardsub_srt", "Softsub (Mux)": "softsub", "Internal Hardsub": "hardsub_internal"}
+CACHE_DIR = Path.home() / ".cache" / "ffstudio"
+# Scratch files (extracted subs, filter scripts) live in app-private tmp, not on FUSE-backed shared storage
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="ffstudio_"))
+atexit.register(shutil.rmtree, SCRATCH_DIR, ignore_errors=True)
+# Resolved once: None outside Termux (or without termux-api), which silences notifications
+TERMUX_NOTIFY = shutil.which("termux-notification")
 
 # ===== THEME & UI CONSTANTS =====
 CUSTOM_THEME = Theme({
@@ -80,6 +94,51 @@ Q_STYLE = Style([
     ('pointer', 'fg:#ff00ff bold'),
 ])
 
+# ===== HARDWARE ENCODING =====
+_ENCODER_CACHE: Optional[str] = None
+
+def _detect_encoder() -> str:
+    """Returns the best H.264 encoder the device exposes (MediaCodec, then V4L2 M2M, else libx264). Probed once per session."""
+    global _ENCODER_CACHE
+    if _ENCODER_CACHE is None:
+        try:
+            out = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+        except OSError:
+            out = ""
+        available = set(out.split())
+        _ENCODER_CACHE = next((e for e in ("h264_mediacodec", "h264_v4l2m2m") if e in available), "libx264")
+    return _ENCODER_CACHE
+
+_DECODER_CACHE: Optional[str] = None
+
+def _detect_decoder() -> Optional[str]:
+    """Returns the hwaccel to decode with ('mediacodec' on Termux, 'cuda' elsewhere), or None. Probed once per session."""
+    global _DECODER_CACHE
+    if _DECODER_CACHE is None:
+        try:
+            out = subprocess.run(["ffmpeg", "-hide_banner", "-hwaccels"], capture_output=True, text=True).stdout
+        except OSError:
+            out = ""
+        available = set(out.split())
+        _DECODER_CACHE = next((d for d in ("mediacodec", "cuda") if d in available), "")
+    return _DECODER_CACHE or None
+
+def _disable_decoder():
+    """Drops hardware decode for the rest of the session once the device refused to start."""
+    global _DECODER_CACHE
+    _DECODER_CACHE = ""
+
+# ffmpeg errors that mean the hardware decoder (not the job itself) failed: device setup, missing CUDA, decoder open.
+# MediaCodec decoders and encoders share names, so only decoder-side messages count here.
+_HWACCEL_ERROR_RE = re.compile(
+    r"device creation failed|failed setup for format|hwaccel init|hardware device|libcuda|load cuda|no device available"
+    r"|unknown decoder|error while opening decoder|failed to create media decoder",
+    re.IGNORECASE)
+
+# ffmpeg errors that mean an output's encoder refused to open (resolution, session limit): retried on libx264
+_ENCODER_ERROR_RE = re.compile(
+    r"error while opening encoder|error initializing output stream|could not open encoder", re.IGNORECASE)
+
 # ===== DATA MODELS =====
 @dataclass
 class JobConfig:
@@ -95,12 +154,40 @@ class JobConfig:
     use_opaque_box: bool = False
     
     # Video Options
-    watermark_path: Optional[Path] = None
-    watermark_pos: str = "Bottom-Right"
-    resolution: str = "Original"  # 'Original', '720p', '480p'
+    watermark_paths: List[Path] = field(default_factory=list)
+    watermark_positions: List[str] = field(default_factory=list)  # parallel to watermark_paths
+    resolutions: List[str] = field(default_factory=lambda: ["Original"])  # any of 'Original', '720p', '480p'
     is_preview: bool = False
+    hw_accel: bool = True  # use the detected hardware encoder and decoder; False forces libx264 and software decode
 
 # ===== SUBTITLE ENGINE =====
+# Anchored, fixed-width timing line: matches in linear time, no backtracking
+_SRT_TIMING_RE = re.compile(r'(\d{2}:\d{2}:\d{2}),(\d{2})\d --> (\d{2}:\d{2}:\d{2}),(\d{2})\d')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# Font family names keyed by (path, mtime_ns, size), persisted across sessions
+FONT_CACHE_FILE = CACHE_DIR / "fontnames.json"
+
+def _load_font_cache() -> Dict[Tuple[str, int, int], str]:
+    try:
+        entries = json.loads(FONT_CACHE_FILE.read_text(encoding="utf-8"))
+        return {(path, mtime, size): name for path, mtime, size, name in entries}
+    except (OSError, ValueError, TypeError):
+        return {}
+
+def _save_font_cache():
+    try:
+        FONT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = FONT_CACHE_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps([[*key, name] for key, name in _FONT_NAME_CACHE.items()]), encoding="utf-8")
+        os.replace(tmp, FONT_CACHE_FILE)  # atomic: a crash never leaves a half-written cache
+    except OSError:
+        pass
+
+_FONT_NAME_CACHE: Dict[Tuple[str, int, int], str] = _load_font_cache()
+# ASS scripts are built on worker threads, several at once in batch mode: one pip install and one cache writer at a time
+_FONT_LOCK = threading.Lock()
+
 class AssGenerator:
     """Handles conversion of SRT to ASS with custom styling."""
     
@@ -118,16 +205,66 @@ class AssGenerator:
     def _get_font_name(font_path: Optional[Path]) -> str:
         if not font_path: return "Arial"
         try:
-            font = TTFont(str(font_path))
-            name = font['name'].getName(1, 3, 1)
-            return name.toUnicode() if name else font_path.stem
-        except:
+            st = font_path.stat()
+        except OSError:
             return font_path.stem
+        key = (str(font_path), st.st_mtime_ns, st.st_size)
+        with _FONT_LOCK:
+            if key in _FONT_NAME_CACHE: return _FONT_NAME_CACHE[key]
+
+            try:
+                # Only custom fonts need fontTools, so it stays off the startup path
+                try:
+                    from fontTools.ttLib import TTFont
+                except ImportError:
+                    install_requirements(("fontTools",), restart=False)
+                    from fontTools.ttLib import TTFont
+
+                # lazy=True: only the 'name' table gets decompiled, not glyf/CFF
+                with TTFont(str(font_path), lazy=True) as font:
+                    name = font['name'].getName(1, 3, 1)
+                    family = name.toUnicode() if name else font_path.stem
+            except Exception as e:
+                console.print(f"[warning]Can't read font name ({escape(str(e))}), using file name.[/]")
+                return font_path.stem
+
+            _FONT_NAME_CACHE[key] = family
+            _save_font_cache()
+            return family
+
+    @staticmethod
+    def _iter_cues(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+        """Walks SRT lines once (index -> timing -> text -> blank), yielding (start, end, text) in ASS time format."""
+        def joined(text_lines: List[str]) -> str:
+            while text_lines and not text_lines[-1]: text_lines.pop()  # whitespace-only tail, not text
+            return "\\N".join(text_lines)
+
+        start = end = None
+        text_lines: List[str] = []
+        for raw in lines:
+            line = raw.strip()
+            timing = _SRT_TIMING_RE.match(line)
+            if timing:
+                # Tolerate a missing blank line: a new timing line closes the previous cue
+                if start and text_lines:
+                    if text_lines[-1].isdigit(): text_lines.pop()
+                    text = joined(text_lines)
+                    if text: yield start, end, text
+                start, end = f"{timing[1]}.{timing[2]}", f"{timing[3]}.{timing[4]}"
+                text_lines = []
+            elif not raw.rstrip("\r\n"):
+                # Only a truly empty line ends a cue; a whitespace-only one is part of the text, as SRT readers treat it
+                text = joined(text_lines) if start else ""
+                if text: yield start, end, text
+                start, text_lines = None, []
+            elif start:
+                text_lines.append(line)
+        text = joined(text_lines) if start else ""
+        if text: yield start, end, text
 
     @classmethod
-    def create(cls, srt_path: Path, config: JobConfig) -> Path:
-        ass_path = DIRECTORIES["OUTPUT"] / f"temp_{int(time.time())}.ass"
-        
+    def create(cls, srt_path: Path, config: JobConfig) -> bytes:
+        """Returns the styled ASS script in memory; it is piped straight into ffmpeg, never written to storage."""
         font_name = cls._get_font_name(config.font_path)
         primary_color = cls._hex_to_ass(config.color_hex)
         
@@ -154,46 +291,78 @@ class AssGenerator:
             Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         """).strip() + "\n"
 
-        regex = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n((?:.+\n?)+)')
-        
         try:
-            with open(srt_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
-                content = f.read()
-            
-            if not content.strip(): raise ValueError("SRT file is empty")
-
-            with open(ass_path, 'w', encoding='utf-8') as f:
-                f.write(header)
-                for match in regex.finditer(content):
-                    start = match.group(2).replace(',', '.')[:-1]
-                    end = match.group(3).replace(',', '.')[:-1]
-                    text = re.sub(r'<[^>]+>', '', match.group(4).strip()).replace('\n', '\\N')
-                    f.write(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}\n")
+            lines = [header]
+            with open(srt_path, 'r', encoding='utf-8-sig', errors='ignore') as src:
+                for start, end, text in cls._iter_cues(src):
+                    # Most cues carry no markup; the substring test is far cheaper than a regex pass
+                    if '<' in text: text = _TAG_RE.sub('', text)
+                    lines.append(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}\n")
+
+            if len(lines) == 1: raise ValueError("SRT file is empty")
             
-            return ass_path
+            return "".join(lines).encode("utf-8")
         except Exception as e:
             console.print(f"[error]Error generating ASS:[/error] {e}")
             raise
 
 # ===== FFMPEG WORKER =====
+# Filter-graph path escaping; the quote needs a multi-char replacement so it stays a separate str.replace
+_PATH_TRANSLATE = str.maketrans({'\\': '/', ':': '\\:'})
+
+def _feed_pipe(fd: int, data: bytes):
+    """Writes data into a pipe ffmpeg reads from, then closes it (EOF). Blocking, so run it in a thread."""
+    try:
+        with open(fd, 'wb') as f:
+            f.write(data)
+    except BrokenPipeError:
+        pass  # ffmpeg exited before reading everything; its own log says why
+
 class MediaProcessor:
-    def __init__(self, config: JobConfig):
+    # ffmpeg prints "Duration: HH:MM:SS.ss" for each input before encoding starts
+    _DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+\.\d+)")
+    # Probed codec_name -> MediaCodec decoder; -hwaccel mediacodec alone leaves the software decoder in charge
+    _MEDIACODEC_DECODERS = {
+        "h264": "h264_mediacodec", "hevc": "hevc_mediacodec", "mpeg2video": "mpeg2_mediacodec",
+        "mpeg4": "mpeg4_mediacodec", "vp8": "vp8_mediacodec", "vp9": "vp9_mediacodec", "av1": "av1_mediacodec"
+    }
+    # Audio codecs the MP4 muxer takes as-is
+    _MP4_AUDIO = {"aac", "mp3", "ac3", "eac3", "alac"}
+    # Watermark position -> overlay x:y, 20px from the edges
+    _POS_MAP = {
+        "Top-Left": "20:20", "Top-Right": "main_w-overlay_w-20:20",
+        "Bottom-Left": "20:main_h-overlay_h-20", "Bottom-Right": "main_w-overlay_w-20:main_h-overlay_h-20",
+        "Center": "(main_w-overlay_w)/2:(main_h-overlay_h)/2"
+    }
+
+    def __init__(self, config: JobConfig, progress: Optional[Progress] = None, threads: Optional[int] = None):
         self.cfg = config
-        prefix = "PREVIEW_" if self.cfg.is_preview else "FINAL_"
-        self.output_file = DIRECTORIES["OUTPUT"] / f"{prefix}{self.cfg.video_path.stem}.mp4"
+        self.progress = progress  # shared multi-task bar in batch mode; None = own bar and panels
+        self.threads = threads    # per-process encoder thread cap so parallel jobs don't oversubscribe cores
+        self._hw_state = False    # True while the graph being built still carries frames in CUDA memory
+        self.sw_encode = False    # set once the hardware encoder refused this job, so its retry uses libx264
+        self._tag = ""            # filter label prefix, unique per job when several share one ffmpeg process
+        self.output_file = self._output_for(self.cfg.is_preview)
         self.cleanup_files = []
+        self.pipes = []  # (read_fd, write_fd, payload): in-memory inputs handed to ffmpeg as pipe:<fd>
+        self.progress_pipe: Optional[Tuple[int, int]] = None  # (read_fd, write_fd): ffmpeg writes -progress here
 
-    def _escape_path(self, path: Path) -> str:
-        return str(path).replace('\\', '/').replace(':', '\\:').replace("'", "'\\''")
+    def _output_for(self, is_preview: bool) -> Path:
+        prefix = "PREVIEW_" if is_preview else "FINAL_"
+        return DIRECTORIES["OUTPUT"] / f"{prefix}{self.cfg.video_path.stem}.mp4"
+
+    def _escape_path(self, path: Union[str, Path]) -> str:
+        return str(path).translate(_PATH_TRANSLATE).replace("'", "'\\''")
 
     async def _extract_internal_sub(self) -> Optional[Path]:
-        temp_srt = DIRECTORIES["OUTPUT"] / "temp_extract.srt"
+        temp_srt = SCRATCH_DIR / f"temp_extract_{id(self):x}.srt"
         cmd = [
             "ffmpeg", "-y", "-i", str(self.cfg.video_path), 
             "-map", f"0:{self.cfg.internal_sub_index}", 
             str(temp_srt)
         ]
-        p = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        # Nothing reads ffmpeg's chatter here; a PIPE would only fill up
+        p = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
         await p.wait()
         
         if temp_srt.exists() and temp_srt.stat().st_size > 0:
@@ -202,185 +371,660 @@ class MediaProcessor:
         return None
 
     async def get_video_duration(self) -> float:
-        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", str(self.cfg.video_path)]
-        try:
-            p = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
-            out, _ = await p.communicate()
-            return float(out.decode().strip())
-        except: return 0.0
+        return (await probe_media(self.cfg.video_path))["duration"]
 
-    async def run(self):
-        # 1. Prepare Subtitles (Only for Hardsub modes)
-        ass_file = None
-        if "hardsub" in self.cfg.mode:
-            with console.status("[bold magenta]Preparing Hardsub...[/]", spinner="dots"):
-                srt_source = self.cfg.subtitle_path
-                
-                if self.cfg.mode == 'hardsub_internal':
-                    srt_source = await self._extract_internal_sub()
-                    if not srt_source: return
-
-                if srt_source:
-                    try:
-                        ass_file = AssGenerator.create(srt_source, self.cfg)
-                        self.cleanup_files.append(ass_file)
-                    except Exception: return
+    async def _prepare_ass(self) -> Optional[bytes]:
+        """Builds the styled ASS script for hardsub modes. Returns None if the job can't continue."""
+        # rich allows one live display at a time, so batch jobs skip the spinner while the shared bar runs
+        status = contextlib.nullcontext() if self.progress else console.status("[bold magenta]Preparing Hardsub...[/]", spinner="dots")
+        with status:
+            srt_source = self.cfg.subtitle_path
+            
+            if self.cfg.mode == 'hardsub_internal':
+                srt_source = await self._extract_internal_sub()
+            if not srt_source: return None
 
-        # 2. Build FFmpeg Command
-        cmd = ["ffmpeg", "-y", "-i", str(self.cfg.video_path)]
+            try:
+                # Off the event loop: SRT parsing and the font lookup overlap the ffprobe task and keep the spinner live
+                return await asyncio.to_thread(AssGenerator.create, srt_source, self.cfg)
+            except Exception: return None
+
+    @staticmethod
+    def _fan_out(filters: List[str], label: str, prefix: str, count: int) -> List[str]:
+        """Returns `count` labels carrying `label`. Filter pads get a split; raw input streams can be reused as-is."""
+        if count == 1 or label.endswith(":v]"): return [label] * count
+        labels = [f"[{prefix}{i}]" for i in range(count)]
+        filters.append(f"{label}split={count}{''.join(labels)}")
+        return labels
+
+    def _overlay_watermarks(self, filters: List[str], last_vid: str, by_pos: Dict[str, List[int]], branch: int) -> str:
+        """Composites the watermark inputs grouped by position onto `last_vid` and returns the resulting label.
+
+        Logos sharing a corner are tiled side by side with one xstack, so each corner costs a single overlay.
+        """
+        t = self._tag
+        for n, (pos, indices) in enumerate(by_pos.items()):
+            logo = f"[{indices[0]}:v]"
+            if len(indices) > 1:
+                # xstack needs one pixel format; rgba keeps logo alpha and the transparent fill
+                tiles = []
+                for k, idx in enumerate(indices):
+                    filters.append(f"[{idx}:v]format=rgba[{t}wm{branch}_{n}_{k}]")
+                    tiles.append(f"[{t}wm{branch}_{n}_{k}]")
+                # Single row: tile k sits right of tiles 0..k-1 -> "0_0|w0_0|w0+w1_0|..."
+                layout = "|".join(["0_0"] + ["+".join(f"w{j}" for j in range(k)) + "_0" for k in range(1, len(indices))])
+                filters.append(f"{''.join(tiles)}xstack=inputs={len(indices)}:layout={layout}:fill=0x00000000[{t}wm{branch}_{n}]")
+                logo = f"[{t}wm{branch}_{n}]"
+            xy = self._POS_MAP.get(pos, "20:20")
+            filters.append(f"{last_vid}{logo}overlay={xy}[{t}v_wm{branch}_{n}]")
+            last_vid = f"[{t}v_wm{branch}_{n}]"
+        return last_vid
+
+    def _video_codec_args(self, encoder: str) -> List[str]:
+        if encoder == "libx264":
+            # Sliced threads keep every core busy even on short clips, for ~1-2% compression efficiency;
+            # a shorter lookahead cuts latency and memory. Batch jobs keep their per-process thread cap.
+            threads = self.threads or 0
+            return ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-threads", str(threads),
+                    "-x264-params", f"threads={threads or 'auto'}:sliced-threads=1:rc-lookahead=10"]
+        # Hardware encoders ignore CRF, so they get a target bitrate; MediaCodec drivers commonly reject B-frames
+        args = ["-c:v", encoder, "-b:v", "4M"]
+        if encoder == "h264_mediacodec": args.extend(["-bf", "0"])
+        return args
+
+    def _scale_filter(self, h: str, fast: bool = False) -> str:
+        # The pixel format conversion rides along in the same swscale pass instead of a later auto-inserted one
+        if self._hw_state: return f"scale_cuda=-2:{h}:format=nv12"
+        return f"scale=-2:{h}:flags={'fast_bilinear' if fast else 'bicubic'},format=yuv420p"
+
+    def _scale(self, filters: List[str], src: str, res: str, label: str, fast: bool = False) -> str:
+        """Appends a scale node for a 720p/480p target and returns its label; Original passes src through.
+
+        `fast` trades sharpness for speed and is meant for branches that only feed previews.
+        """
+        if res == "Original": return src
+        h = "720" if res == "720p" else "480"
+        filters.append(f"{src}{self._scale_filter(h, fast)}[{label}]")
+        return f"[{label}]"
+
+    def _to_sysmem(self, filters: List[str], src: str, label: str) -> str:
+        """Downloads GPU frames once, at the first node that needs them in system memory (libass, overlay, encoder)."""
+        if not self._hw_state: return src
+        filters.append(f"{src}hwdownload,format=nv12[{label}]")
+        self._hw_state = False
+        return f"[{label}]"
+
+    def _job_args(self, ass_data: Optional[bytes], outputs: List[Tuple[Path, bool, str]], probe: Optional[dict] = None,
+                  base: int = 0, tag: str = "") -> Tuple[List[str], List[str], List[str]]:
+        """Returns (input args, filter nodes, output args) rendering every (path, is_preview, resolution) output from one decode.
+
+        Inputs are numbered from `base` and filter labels start with `tag`, so several jobs can share one ffmpeg process.
+        """
+        self._tag = tag
+        video = f"{base}:v"
+        inputs = ["-i", str(self.cfg.video_path)]
         
         # Keep track of input indices
-        # Index 0: Video
-        watermark_index = -1
+        # Index base: Video
+        watermark_indices = []
         softsub_index = -1
-        current_input_idx = 1
+        current_input_idx = base + 1
 
-        # Add Watermark Input if needed
-        if self.cfg.watermark_path:
-            cmd.extend(["-i", str(self.cfg.watermark_path)])
-            watermark_index = current_input_idx
+        # Add Watermark Inputs if needed
+        # An identical logo at the same spot is fully hidden by its twin, so it is never decoded or composited
+        watermarks = list(dict.fromkeys(zip(self.cfg.watermark_paths, self.cfg.watermark_positions)))
+        for wm_path, _ in watermarks:
+            inputs.extend(["-i", str(wm_path)])
+            watermark_indices.append(current_input_idx)
             current_input_idx += 1
         
         # Add Softsub Input if needed (<-- FIX 1: Softsub Logic)
         if self.cfg.mode == "softsub" and self.cfg.subtitle_path:
-            cmd.extend(["-i", str(self.cfg.subtitle_path)])
+            inputs.extend(["-i", str(self.cfg.subtitle_path)])
             softsub_index = current_input_idx
             current_input_idx += 1
 
-        if self.cfg.is_preview:
-            cmd.extend(["-ss", "00:00:30", "-t", "15"])
-
         # Filter Complex Logic
         filters = []
-        last_vid = "[0:v]"
+        last_vid = f"[{video}]"
+
+        # 0. Variable frame rate sources: pin the rate before subtitles/overlay so they can't be flooded with duplicates
+        if probe and probe["vfr"] and (ass_data or watermarks):
+            filters.append(f"{last_vid}fps={probe['fps']}[{tag}v_cfr]")
+            last_vid = f"[{tag}v_cfr]"
+
+        # CUDA decode keeps frames on the GPU when every output is scaled there first;
+        # Original outputs are copied or encoded from plain system-memory frames
+        resolutions = list(dict.fromkeys(res for _, _, res in outputs))
+        decoder = _detect_decoder() if self.cfg.hw_accel else None
+        mc_decoder = self._MEDIACODEC_DECODERS.get((probe or {}).get("vcodec")) if decoder == "mediacodec" else None
+        if decoder == "mediacodec" and not mc_decoder: decoder = None  # unknown codec: nothing would run in hardware
+        gpu_frames = self._hw_state = decoder == "cuda" and "Original" not in resolutions and last_vid == f"[{video}]"
+
+        # A single downscaled resolution scales before burning, so libass rasterises glyphs at output size
+        prescaled = bool(ass_data) and len(resolutions) == 1
+        if prescaled:
+            last_vid = self._scale(filters, last_vid, resolutions[0], f"{tag}v_scale", all(p for _, p, _ in outputs))
         
         # A. Hardsub Burning
-        if ass_file:
+        # The subtitles filter opens its file through libavformat, so it can read the script from an inherited pipe
+        if ass_data:
+            last_vid = self._to_sysmem(filters, last_vid, f"{tag}v_dl")
+            read_fd, write_fd = os.pipe()
+            self.pipes.append((read_fd, write_fd, ass_data))
             fonts_dir = self.cfg.font_path.parent if self.cfg.font_path else DIRECTORIES["FONTS"]
-            filters.append(f"{last_vid}subtitles='{self._escape_path(ass_file)}':fontsdir='{self._escape_path(fonts_dir)}'[v_sub]")
-            last_vid = "[v_sub]"
+            filters.append(f"{last_vid}subtitles='{self._escape_path(f'pipe:{read_fd}')}':fontsdir='{self._escape_path(fonts_dir)}'[{tag}v_sub]")
+            last_vid = f"[{tag}v_sub]"
         
-        # B. Scaling
-        if self.cfg.resolution != "Original":
-            h = "720" if self.cfg.resolution == "720p" else "480"
-            filters.append(f"{last_vid}scale=-2:{h}[v_scale]")
-            last_vid = "[v_scale]"
-        
-        # C. Watermark Overlay
-        if watermark_index != -1:
-            pos_map = {
-                "Top-Left": "20:20", "Top-Right": "main_w-overlay_w-20:20",
-                "Bottom-Left": "20:main_h-overlay_h-20", "Bottom-Right": "main_w-overlay_w-20:main_h-overlay_h-20",
-                "Center": "(main_w-overlay_w)/2:(main_h-overlay_h)/2"
-            }
-            xy = pos_map.get(self.cfg.watermark_pos, "20:20")
-            filters.append(f"{last_vid}[{watermark_index}:v]overlay={xy}[v_fin]")
-            last_vid = "[v_fin]"
+        # B. Scaling + C. Watermark Overlay, one branch per requested resolution
+        # Several resolutions split the decoded (and subtitled) frames, so decode and libass run once for all of them
+        by_pos: Dict[str, List[int]] = {}
+        for (_, pos), idx in zip(watermarks, watermark_indices):
+            by_pos.setdefault(pos, []).append(idx)
+
+        branches = {}
+        hw_at_split = self._hw_state
+        for b, (res, src) in enumerate(zip(resolutions, self._fan_out(filters, last_vid, f"{tag}v_res", len(resolutions)))):
+            self._hw_state = hw_at_split  # every branch of the split starts where the shared chain left off
+            if not prescaled:
+                preview_only = all(p for _, p, r in outputs if r == res)
+                src = self._scale(filters, src, res, f"{tag}v_scale{b}", preview_only)
+            src = self._to_sysmem(filters, src, f"{tag}v_dl{b}")
+            branches[res] = self._overlay_watermarks(filters, src, by_pos, b)
 
+        # D. Fan-out: a filter output pad can only be mapped once, so split it per output
+        out_labels = [""] * len(outputs)
+        for res, label in branches.items():
+            users = [i for i, (_, _, r) in enumerate(outputs) if r == res]
+            for i, out_label in zip(users, self._fan_out(filters, label, f"{tag}v_out_{res}_", len(users))):
+                out_labels[i] = out_label
+
+        encoder = _detect_encoder() if self.cfg.hw_accel and not self.sw_encode else "libx264"
+
+        # Hardware decode whenever frames get decoded at all (stream copies skip decoding entirely)
+        if decoder and (filters or any(is_preview for _, is_preview, _ in outputs)):
+            hw_args = ["-hwaccel", decoder]
+            if gpu_frames or (not filters and encoder == f"h264_{decoder}"):
+                # Frames stay in device memory: scale_cuda works on them, or decoder surfaces go straight to the encoder.
+                # Otherwise they must land in system memory, which is -hwaccel's default.
+                hw_args.extend(["-hwaccel_output_format", decoder])
+            if mc_decoder: hw_args.extend(["-c:v", mc_decoder])
+            inputs[0:0] = hw_args
+
+        # Pure remux (softsub or untouched Original): MP4-safe audio is copied too, so nothing gets decoded
+        audio_copy = bool(probe) and all(c in self._MP4_AUDIO for c in probe["audio"])
+
+        cmd = []
+        for (output_file, is_preview, _), label in zip(outputs, out_labels):
+            untouched = label == f"[{video}]"
+            copy_video = untouched and not is_preview
+            cmd.extend(["-map", video if untouched else label])
+
+            # Audio Settings (<-- FIX 2: Force AAC for MP4)
+            cmd.extend(["-map", f"{base}:a?"])
+            cmd.extend(["-c:a", "copy"] if copy_video and audio_copy else ["-c:a", "aac", "-b:a", "192k"])
+
+            # Softsub Mapping (<-- FIX 1 Continuation)
+            # Every stream is mapped explicitly, so internal subs never leak in. No -sn: it also drops mapped subs.
+            if softsub_index != -1:
+                cmd.extend(["-map", f"{softsub_index}:0", "-c:s", "mov_text", "-disposition:s:0", "default"])
+
+            # Video Encoding
+            if copy_video:
+                # Nothing to burn, scale or overlay: remux the video stream untouched
+                cmd.extend(["-c:v", "copy"])
+            else:
+                cmd.extend(self._video_codec_args(encoder))
+            if self.threads and not copy_video and encoder != "libx264":
+                cmd.extend(["-threads", str(self.threads)])
+            if not copy_video:
+                # Keep source timestamps: no frames duplicated or dropped to hit a constant output rate
+                cmd.extend(["-fps_mode", "passthrough"])
+
+            # Output-side seek: the preview cut is taken after filtering, so other outputs stay full length
+            if is_preview:
+                cmd.extend(["-ss", "00:00:30", "-t", "15"])
+
+            cmd.append(str(output_file))
+        return inputs, filters, cmd
+
+    def _assemble(self, inputs: List[str], filters: List[str], out_args: List[str]) -> List[str]:
+        cmd = ["ffmpeg", "-y"] + inputs
         if filters:
-            cmd.extend(["-filter_complex", ";".join(filters), "-map", last_vid])
+            # Long graphs (escaped paths, overlays) can overflow argv on Android, so hand ffmpeg a script file
+            graph_path = SCRATCH_DIR / f"graph_{id(self):x}.txt"
+            graph_path.write_text(";".join(filters), encoding="utf-8")
+            self.cleanup_files.append(graph_path)
+            cmd.extend(["-filter_complex_script", str(graph_path)])
+
+        # Progress gets its own fd so its key=value lines never mix with the log on stderr
+        self.progress_pipe = os.pipe()
+        cmd.extend(["-progress", f"pipe:{self.progress_pipe[1]}", "-nostats"])
+        return cmd + out_args
+
+    def _build_command(self, ass_data: Optional[bytes], outputs: List[Tuple[Path, bool, str]], probe: Optional[dict] = None) -> List[str]:
+        """Builds one ffmpeg argv that renders every (path, is_preview, resolution) output from a single decode."""
+        return self._assemble(*self._job_args(ass_data, outputs, probe))
+
+    def _outputs(self, previews: List[Path], finals: List[Path]) -> List[Tuple[Path, bool, str]]:
+        """Previews show the first resolution only; finals get one file per resolution, suffixed when there are several."""
+        resolutions = self.cfg.resolutions or ["Original"]
+        outputs = [(p, True, resolutions[0]) for p in previews]
+        for f in finals:
+            for res in resolutions:
+                path = f.with_name(f"{f.stem}_{res}{f.suffix}") if len(resolutions) > 1 else f
+                outputs.append((path, False, res))
+        return outputs
+
+    async def run(self):
+        if self.cfg.is_preview:
+            await self.run_batched([self.output_file], [])
         else:
-            cmd.extend(["-map", "0:v"])
+            await self.run_batched([], [self.output_file])
 
-        # Audio Settings (<-- FIX 2: Force AAC for MP4)
-        cmd.extend(["-map", "0:a?", "-c:a", "aac", "-b:a", "192k"])
+    async def run_batched(self, previews: List[Path], finals: List[Path]):
+        """Renders preview cuts and full renders of the same settings in one ffmpeg process.
 
-        # Softsub Mapping (<-- FIX 1 Continuation)
-        if softsub_index != -1:
-            cmd.extend(["-map", f"{softsub_index}:0", "-c:s", "mov_text"])
+        Decoding, subtitle rasterization and watermark compositing run once and are split per output.
+        """
+        # The graph needs VFR info, full renders the duration and MediaCodec decode the video codec,
+        # so ffprobe runs alongside subtitle extraction instead of after it
+        hardsub = "hardsub" in self.cfg.mode
+        probe_task = asyncio.create_task(probe_media(self.cfg.video_path))
 
-        # Video Encoding
-        cmd.extend(["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-sn"])
-        # Note: -sn prevents copying internal subs from input video if we are doing softsub external
-        
-        cmd.extend(["-progress", "pipe:1", str(self.output_file)])
+        # 1. Prepare Subtitles (Only for Hardsub modes)
+        try:
+            ass_data = await self._prepare_ass() if hardsub else None
+        finally:
+            probe = await probe_task  # never left running, even when subtitle preparation raises
+        if hardsub and not ass_data: return
+
+        # 2. Build FFmpeg Command
+        outputs = self._outputs(previews, finals)
+        cmd = self._build_command(ass_data, outputs, probe)
 
         # 3. Execution
-        job_type = "PREVIEW (Synced)" if self.cfg.is_preview else "FULL RENDER"
-        console.rule(f"[bold cyan]🚀 {job_type}[/]")
-        
-        total_duration = 15.0 if self.cfg.is_preview else await self.get_video_duration()
+        if previews and finals: job_type = "PREVIEW + FULL RENDER"
+        elif previews: job_type = "PREVIEW (Synced)"
+        else: job_type = "FULL RENDER"
+        # A failed probe leaves it to ffmpeg's own Duration header
+        total_duration = (probe["duration"] or None) if finals else 15.0
+        output_files = [o[0] for o in outputs]
+        if not await self._execute(cmd, job_type, total_duration, output_files, notify=bool(finals)):
+            cmd = self._build_command(ass_data, outputs, probe)
+            await self._execute(cmd, job_type, total_duration, output_files, notify=bool(finals))
+
+    async def _execute(self, cmd: List[str], job_type: str, total_duration: Optional[float], output_files: List[Path], notify: bool) -> bool:
+        """Runs one ffmpeg pass. Returns False only when the hardware decoder or encoder failed and a retry is worth it."""
+        if not self.progress:
+            console.rule(f"[bold cyan]🚀 {job_type}[/]")
         
-        # Redirect stderr to stdout to prevent hanging
+        progress_r, progress_w = self.progress_pipe
         process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            pass_fds=[read_fd for read_fd, _, _ in self.pipes] + [progress_w]
         )
+        os.close(progress_w)  # the child holds the only write end, so EOF arrives when ffmpeg exits
+        feeders = []
+        for read_fd, write_fd, payload in self.pipes:
+            os.close(read_fd)
+            feeders.append(asyncio.create_task(asyncio.to_thread(_feed_pipe, write_fd, payload)))
+        self.pipes = []
+        self.progress_pipe = None
 
-        error_logs = []
-        with Progress(
-            SpinnerColumn("dots", style="cyan"),
-            TextColumn("[bold white]{task.description}"),
-            BarColumn(bar_width=None, style="magenta", complete_style="bold cyan"),
-            TextColumn("{task.percentage:>3.0f}%"),
-            TimeRemainingColumn(),
-            console=console
-        ) as progress:
-            task_id = progress.add_task("Processing...", total=100)
-            while True:
-                line = await process.stdout.readline()
-                if not line: break
+        error_logs = deque(maxlen=20)
+
+        async def drain_stderr():
+            # Stderr is drained on its own so a chatty ffmpeg can never block on a full pipe
+            nonlocal total_duration
+            async for line in process.stderr:
                 line_str = line.decode('utf-8', 'ignore').strip()
                 error_logs.append(line_str)
-                if len(error_logs) > 20: error_logs.pop(0)
+                if total_duration is None:
+                    m = self._DURATION_RE.search(line_str)
+                    if m:
+                        h, mi, sec = m.groups()
+                        total_duration = int(h) * 3600 + int(mi) * 60 + float(sec)
+
+        drainer = asyncio.create_task(drain_stderr())
+        reader = asyncio.StreamReader()
+        transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), open(progress_r, 'rb', buffering=0))
 
-                if line_str.startswith('out_time_us='):
-                    try:
-                        us = int(line_str.split('=')[1])
-                        current_sec = us / 1_000_000
-                        percentage = (current_sec / total_duration) * 100
-                        progress.update(task_id, completed=percentage)
-                    except: pass
+        progress = self.progress or make_progress()
+        with contextlib.nullcontext() if self.progress else progress:
+            description = escape(self.cfg.video_path.name) if self.progress else "Processing..."
+            task_id = progress.add_task(description, total=100)
+            # Read whatever has arrived and act on the newest timestamp only: one wakeup per chunk, not per line
+            buf = b""
+            while chunk := await reader.read(65536):
+                buf += chunk
+                head, _, buf = buf.rpartition(b"\n")  # keep a half-written trailing line for the next chunk
+                at = head.rfind(b"out_time_us=")
+                if at == -1 or not total_duration: continue
+                # out_time_us reads N/A until the first frame is muxed
+                value = head[at + 12:].split(b"\n", 1)[0].strip()
+                if value.isdigit():
+                    progress.update(task_id, completed=int(value) / 1_000_000 / total_duration * 100)
 
+        transport.close()
         await process.wait()
+        await asyncio.gather(drainer, *feeders)
         for f in self.cleanup_files:
-            if f.exists(): os.remove(f)
+            f.unlink(missing_ok=True)
 
-        if process.returncode == 0:
-            console.print(Panel(f"[green]Saved to:[/]\n{self.output_file.name}", border_style="green", title="SUCCESS"))
-            if not self.cfg.is_preview and shutil.which("termux-notification"):
-                subprocess.run(["termux-notification", "--title", "FFmpeg Studio", "--content", "Render Complete"], check=False)
+        # Only a hardware error is retried; anything else (libass, output, logos) fails with its own log.
+        # An encoder refusal (resolution, busy sessions) only moves this job to libx264 and keeps hardware decode.
+        # A decoder/device failure is dropped session-wide, so later jobs don't each pay a failed spawn.
+        # Output args follow -progress; before it, a MediaCodec name is the decoder
+        hw_encoder = _detect_encoder() != "libx264" and _detect_encoder() in cmd[cmd.index("-progress"):]
+        if process.returncode != 0 and hw_encoder and any(_ENCODER_ERROR_RE.search(l) for l in error_logs):
+            self.sw_encode = True
+            progress.remove_task(task_id)
+            console.print(f"[yellow]Hardware encoder failed on {escape(self.cfg.video_path.name)}, retrying with libx264...[/]")
+            return False
+        if process.returncode != 0 and "-hwaccel" in cmd and any(_HWACCEL_ERROR_RE.search(l) for l in error_logs):
+            _disable_decoder()
+            progress.remove_task(task_id)
+            console.print(f"[yellow]Hardware decoder rejected {escape(self.cfg.video_path.name)}, retrying in software...[/]")
+            return False
+
+        saved = "\n".join(escape(f.name) for f in output_files)
+        if process.returncode == 0 and self.progress:
+            progress.update(task_id, completed=100)
+            console.print(f"[success]✔ Saved:[/] {saved}")
+        elif process.returncode == 0:
+            console.print(Panel(f"[green]Saved to:[/]\n{saved}", border_style="green", title="SUCCESS"))
+            if notify: send_notification("Render Complete")
         else:
             console.print("[bold red]Render Failed![/]")
-            console.print(Panel("\n".join(error_logs), title="Error Log", border_style="red"))
+            console.print(Panel("\n".join(error_logs), title=f"Error Log: {escape(self.cfg.video_path.name)}", border_style="red"))
+        return True
+
+class JobQueue:
+    """Full renders of several queued videos in one ffmpeg process, so start-up and encoder init are paid once."""
+
+    def __init__(self):
+        self.jobs: List[Tuple[JobConfig, Path]] = []  # (settings, final output before resolution suffixes)
+        self.taken: set = set()  # every output file already claimed by a queued job
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def add(self, cfg: JobConfig) -> Path:
+        """Queues a full render and returns its output path, suffixed _2, _3... so one process never writes a file twice."""
+        cfg = replace(cfg, is_preview=False)
+        proc = MediaProcessor(cfg)
+        final, n = proc.output_file, 2
+        while any(o[0] in self.taken for o in proc._outputs([], [final])):
+            final = proc.output_file.with_name(f"{proc.output_file.stem}_{n}{proc.output_file.suffix}")
+            n += 1
+        self.taken.update(o[0] for o in proc._outputs([], [final]))
+        self.jobs.append((cfg, final))
+        return final
+
+    def _build_command(self, lead: MediaProcessor, ready: list, probes: List[dict]) -> List[str]:
+        """Chains every job's inputs, subgraph and outputs; each job numbers its inputs after the previous one's."""
+        inputs, filters, out_args = [], [], []
+        for n, ((proc, ass_data, outputs), probe) in enumerate(zip(ready, probes)):
+            i, f, o = proc._job_args(ass_data, outputs, probe, base=inputs.count("-i"), tag=f"j{n}_")
+            inputs += i; filters += f; out_args += o
+            if proc is not lead:
+                lead.pipes += proc.pipes
+                proc.pipes = []
+        return lead._assemble(inputs, filters, out_args)
+
+    async def run(self):
+        # Every probe runs while the subtitle scripts are being prepared
+        probe_tasks = [asyncio.create_task(probe_media(cfg.video_path)) for cfg, _ in self.jobs]
+        ready, ready_probes = [], []
+        try:
+            for (cfg, final), probe_task in zip(self.jobs, probe_tasks):
+                proc = MediaProcessor(cfg)
+                ass_data = None
+                if "hardsub" in cfg.mode:
+                    ass_data = await proc._prepare_ass()
+                    if not ass_data:
+                        console.print(f"[error]Skipped {escape(cfg.video_path.name)}:[/] subtitles could not be prepared")
+                        continue
+                ready.append((proc, ass_data, proc._outputs([], [final])))
+                ready_probes.append(probe_task)
+        finally:
+            self.jobs, self.taken = [], set()
+            await asyncio.gather(*probe_tasks)  # skipped jobs' probes settle too, even if preparation raised
+        probes = [t.result() for t in ready_probes]
+        if not ready: return
+
+        # The lead processor runs the shared process and owns every job's pipes and temp files
+        lead = ready[0][0]
+        for proc, _, _ in ready[1:]:
+            lead.cleanup_files += proc.cleanup_files
+        # Jobs run side by side, so the longest input bounds the shared progress bar
+        total_duration = max(p["duration"] for p in probes) or None
+        output_files = [o[0] for _, _, outputs in ready for o in outputs]
+        job_type = f"QUEUE ({len(ready)} videos)"
+
+        cmd = self._build_command(lead, ready, probes)
+        if not await lead._execute(cmd, job_type, total_duration, output_files, notify=True):
+            for proc, _, _ in ready:
+                proc.sw_encode = lead.sw_encode  # an encoder refusal moves every queued job to libx264
+            cmd = self._build_command(lead, ready, probes)
+            await lead._execute(cmd, job_type, total_duration, output_files, notify=True)
 
 # ===== UTILS & UI =====
-async def get_streams(video_path: Path) -> List[Tuple[int, str]]:
-    cmd = ["ffprobe", "-v", "error", "-select_streams", "s", "-show_entries", "stream=index:stream_tags=language,title", "-of", "csv=p=0", str(video_path)]
+def make_progress() -> Progress:
+    return Progress(
+        SpinnerColumn("dots", style="cyan"),
+        TextColumn("[bold white]{task.description}"),
+        BarColumn(bar_width=None, style="magenta", complete_style="bold cyan"),
+        TextColumn("{task.percentage:>3.0f}%"),
+        TimeRemainingColumn(),
+        console=console
+    )
+
+def send_notification(content: str):
+    if TERMUX_NOTIFY:
+        subprocess.run([TERMUX_NOTIFY, "--title", "FFmpeg Studio", "--content", content], check=False)
+
+# ffprobe results keyed by (path, mtime_ns, size): re-entering the menu on the same file never re-probes
+_PROBE_CACHE: Dict[tuple, dict] = {}
+
+def ensure_directories():
+    """Creates only the missing work folders; one scandir of BASE_PATH instead of a stat per folder on shared storage."""
+    try:
+        with os.scandir(BASE_PATH) as it: existing = {e.name for e in it if e.is_dir()}
+    except FileNotFoundError: existing = set()  # first run: mkdir(parents=True) below creates BASE_PATH too
+    for p in DIRECTORIES.values():
+        if p.name not in existing: p.mkdir(parents=True, exist_ok=True)
+
+def _parse_rate(rate: Optional[str]) -> Optional[Fraction]:
+    """ffprobe rate ('24000/1001') as a Fraction; None for missing or '0/0'."""
+    try: return Fraction(rate) or None
+    except (TypeError, ValueError, ZeroDivisionError): return None
+
+def _probe_key(video_path: Path) -> tuple:
+    st = video_path.stat()
+    return (str(video_path), st.st_mtime_ns, st.st_size)
+
+async def probe_media(video_path: Path) -> dict:
+    """Returns {'duration', 'streams': [(index, label)], 'fps', 'vfr', 'audio': [codec], 'vcodec'} from one ffprobe call, cached per file version."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=index,codec_type,codec_name,avg_frame_rate,r_frame_rate:stream_tags=language,title", "-of", "json", str(video_path)]
     try:
+        # A file removed since it was picked yields the failed-probe result instead of raising into the caller
+        key = _probe_key(video_path)
+        if key in _PROBE_CACHE: return _PROBE_CACHE[key]
         p = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
         out, _ = await p.communicate()
-        streams = []
-        for line in out.decode().splitlines():
-            parts = line.split(',')
-            if parts:
-                idx = int(parts[0])
-                info = " ".join(parts[1:]).strip()
-                streams.append((idx, f"Stream #{idx} ({info or 'Unknown'})"))
-        return streams
-    except: return []
+        data = json.loads(out or b"{}")
+        streams, video, audio = [], None, []
+        for s in data.get("streams", []):
+            if s.get("codec_type") == "video" and video is None: video = s
+            if s.get("codec_type") == "audio": audio.append(s.get("codec_name", ""))
+            if s.get("codec_type") != "subtitle": continue
+            tags = s.get("tags", {})
+            label = f"{tags.get('language', '')} {tags.get('title', '')}".strip()
+            streams.append((s["index"], f"Stream #{s['index']} ({label or 'Unknown'})"))
+        # avg_frame_rate drifting from r_frame_rate (the container's base rate) marks a variable frame rate source.
+        # Edit lists and padding nudge a CFR average by a rounding step, so only a >0.5% gap counts.
+        fps = (video or {}).get("avg_frame_rate", "0/0")
+        avg, base = _parse_rate(fps), _parse_rate((video or {}).get("r_frame_rate"))
+        vfr = bool(avg and base) and abs(avg - base) / base > Fraction(1, 200)
+        info = {"duration": float(data.get("format", {}).get("duration", 0.0)), "streams": streams, "fps": fps, "vfr": vfr, "audio": audio,
+                "vcodec": (video or {}).get("codec_name", "")}
+    except: return {"duration": 0.0, "streams": [], "fps": "0/0", "vfr": False, "audio": [], "vcodec": ""}
+    if p.returncode == 0: _PROBE_CACHE[key] = info
+    return info
+
+async def get_streams(video_path: Path) -> List[Tuple[int, str]]:
+    return (await probe_media(video_path))["streams"]
+
+def list_files(directory: Path, extensions: tuple) -> List[Path]:
+    """Files in directory matching extensions, by name; DirEntry.is_file() reuses readdir's d_type, so no stat per entry."""
+    with os.scandir(directory) as it:
+        names = sorted(e.name for e in it if e.name.lower().endswith(extensions) and e.is_file())
+    return [directory / n for n in names]
 
 async def select_file(directory: Path, extensions: tuple, prompt: str) -> Optional[Path]:
-    files = sorted([f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in extensions], key=lambda x: x.name)
-    if not files: return None
-    choices = [f.name for f in files]
+    choices = [f.name for f in list_files(directory, extensions)]
+    if not choices: return None
     if directory.name == "Fonts": choices.insert(0, "Default System Font")
     sel = await questionary.select(f"{prompt}:", choices=choices, style=Q_STYLE).ask_async()
     if not sel or sel == "Default System Font": return None
     return directory / sel
 
+async def ask_mode() -> Optional[str]:
+    mode_label = await questionary.select("Operation Mode:", choices=list(MODE_MAP), style=Q_STYLE).ask_async()
+    return MODE_MAP.get(mode_label)
+
+async def ask_styling(cfg: JobConfig):
+    cfg.font_path = await select_file(DIRECTORIES["FONTS"], ('.ttf', '.otf'), "Font Family")
+    clr = await questionary.select("Font Color:", choices=["Yellow", "White", "Custom Hex"], style=Q_STYLE).ask_async()
+    if clr == "Custom Hex":
+        cfg.color_hex = await questionary.text("Enter Hex:", default="FFFF00").ask_async()
+    else:
+        cfg.color_hex = clr.upper()
+    cfg.use_opaque_box = await questionary.confirm("Add Background Box?", default=False, style=Q_STYLE).ask_async()
+
+    size_opts = ["30 (Standard)", "48 (Large)", "60 (Huge)", "Custom"]
+    sz_sel = await questionary.select("Font Size:", choices=size_opts, default="48 (Large)", style=Q_STYLE).ask_async()
+    if sz_sel == "Custom":
+        raw_size = await questionary.text("Enter Size:", default="48").ask_async()
+        cfg.font_size = int(raw_size) if raw_size.isdigit() else 48
+    else:
+        cfg.font_size = int(sz_sel.split(' ')[0])
+
+async def ask_output_settings(cfg: JobConfig):
+    res_choices = [questionary.Choice("Original", checked=True), "720p", "480p"]
+    cfg.resolutions = await questionary.checkbox("Output Resolutions:", choices=res_choices, style=Q_STYLE).ask_async() or ["Original"]
+
+    # One switch covers both the hardware encoder and hardware decode (e.g. CUDA decode with libx264)
+    if _detect_encoder() != "libx264" or _detect_decoder():
+        cfg.hw_accel = await questionary.confirm(
+            f"Use hardware acceleration (encoder: {_detect_encoder()}, decoder: {_detect_decoder() or 'software'})?",
+            default=True, style=Q_STYLE).ask_async()
+
+    valid_logos = list_files(DIRECTORIES["LOGOS"], ('.png', '.jpg'))
+    if valid_logos:
+        while True:
+            stop = "Done" if cfg.watermark_paths else "None"
+            wm_choices = [stop] + [f.name for f in valid_logos]
+            prompt = "Add Another Watermark:" if cfg.watermark_paths else "Add Watermark:"
+            wm_sel = await questionary.select(prompt, choices=wm_choices, style=Q_STYLE).ask_async()
+            if wm_sel == stop: break
+            cfg.watermark_paths.append(DIRECTORIES["LOGOS"] / wm_sel)
+            cfg.watermark_positions.append(await questionary.select("Position:", choices=["Bottom-Right", "Top-Right", "Top-Left", "Bottom-Left", "Center"], style=Q_STYLE).ask_async())
+
+async def _guarded(sem: asyncio.Semaphore, job):
+    async with sem:
+        await job()
+
+async def batch_render():
+    """Renders every video of a folder with one set of settings, several ffmpeg processes at a time."""
+    # 1. Folder (Input itself or one of its subfolders)
+    input_dir = DIRECTORIES["INPUT"]
+    folders = {"Input/": input_dir}
+    for d in sorted((d for d in input_dir.iterdir() if d.is_dir()), key=lambda d: d.name):
+        folders[f"Input/{d.name}/"] = d
+    sel = await questionary.select("Select Folder:", choices=list(folders), style=Q_STYLE).ask_async()
+    if not sel: return
+    videos = list_files(folders[sel], VIDEO_EXTENSIONS)
+    if not videos:
+        console.print("[yellow]No videos in that folder![/]")
+        return
+
+    # ep1.mkv and ep1.mp4 would both render FINAL_ep1.mp4 and claim Subtitles/ep1.srt: keep the first only
+    by_stem: Dict[str, Path] = {}
+    for video in videos: by_stem.setdefault(video.stem, video)
+    duplicates = [v.name for v in videos if by_stem[v.stem] != v]
+    if duplicates:
+        console.print(f"[warning]Skipping (same name as another video):[/] {escape(', '.join(duplicates))}")
+        videos = list(by_stem.values())
+
+    # 2. Shared settings
+    mode = await ask_mode()
+    if not mode: return
+    template = JobConfig(video_path=videos[0], mode=mode)
+    if "hardsub" in mode: await ask_styling(template)
+    await ask_output_settings(template)
+    if "hardsub" in mode and template.font_path:
+        # Resolve (and if needed install fontTools for) the shared font before the live progress bar starts
+        await asyncio.to_thread(AssGenerator._get_font_name, template.font_path)
+
+    # 3. Per-video subtitles: SRT with the same name, or the first internal subtitle stream
+    cfgs, skipped = [], []
+    for video in videos:
+        cfg = replace(template, video_path=video)
+        if mode in ["hardsub_srt", "softsub"]:
+            cfg.subtitle_path = DIRECTORIES["SUBTITLES"] / f"{video.stem}.srt"
+            if not cfg.subtitle_path.is_file():
+                skipped.append(video.name); continue
+        elif mode == "hardsub_internal":
+            streams = await get_streams(video)
+            if not streams:
+                skipped.append(video.name); continue
+            cfg.internal_sub_index = streams[0][0]
+        cfgs.append(cfg)
+    if skipped:
+        console.print(f"[warning]Skipping (no subtitles found):[/] {escape(', '.join(skipped))}")
+    if not cfgs: return
+
+    # 4. Parallel render: half the cores run jobs, the rest go to their encoder threads
+    cpus = os.cpu_count() or 2
+    concurrency = min(len(cfgs), max(1, cpus // 2))
+    sem = asyncio.Semaphore(concurrency)
+    console.rule(f"[bold cyan]📦 BATCH RENDER ({len(cfgs)} videos, {concurrency} at a time)[/]")
+    with make_progress() as progress:
+        jobs = [_guarded(sem, MediaProcessor(c, progress=progress, threads=max(1, cpus // concurrency)).run) for c in cfgs]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+    for cfg, res in zip(cfgs, results):
+        if isinstance(res, Exception):
+            console.print(f"[error]{escape(cfg.video_path.name)}:[/] {escape(str(res))}")
+    send_notification("Batch Render Complete")
+
 async def main():
     os.system('cls' if os.name == 'nt' else 'clear')
-    for p in DIRECTORIES.values(): p.mkdir(parents=True, exist_ok=True)
+    ensure_directories()
+    _detect_encoder()
+    _detect_decoder()
     console.print(Panel(Align.center(LOGO_TEXT), border_style="magenta", padding=(0, 2)))
+    queue = JobQueue()
 
     while True:
+        job_kind = await questionary.select("Job Type:", choices=["🎬 Single Video", "📦 Batch Render (Select Folder)"], style=Q_STYLE).ask_async()
+        if not job_kind: break
+        if "Batch" in job_kind:
+            await batch_render()
+            if not await questionary.confirm("Process more videos?", default=False, style=Q_STYLE).ask_async():
+                break
+            continue
+
         # 1. Video
-        video = await select_file(DIRECTORIES["INPUT"], ('.mp4', '.mkv', '.avi'), "Select Video")
+        video = await select_file(DIRECTORIES["INPUT"], VIDEO_EXTENSIONS, "Select Video")
         if not video: break
         
-        mode_label = await questionary.select("Operation Mode:", choices=["Hardsub (SRT)", "Softsub (Mux)", "Internal Hardsub"], style=Q_STYLE).ask_async()
-        mode_map = {"Hardsub (SRT)": "hardsub_srt", "Softsub (Mux)": "softsub", "Internal Hardsub": "hardsub_internal"}
-        cfg = JobConfig(video_path=video, mode=mode_map[mode_label])
+        mode = await ask_mode()
+        if not mode: break
+        cfg = JobConfig(video_path=video, mode=mode)
 
         # 2. Subtitles
         if cfg.mode in ["hardsub_srt", "softsub"]:
@@ -398,33 +1042,10 @@ async def main():
 
         # 3. Styling (Hardsub Only)
         if "hardsub" in cfg.mode:
-            cfg.font_path = await select_file(DIRECTORIES["FONTS"], ('.ttf', '.otf'), "Font Family")
-            clr = await questionary.select("Font Color:", choices=["Yellow", "White", "Custom Hex"], style=Q_STYLE).ask_async()
-            if clr == "Custom Hex":
-                cfg.color_hex = await questionary.text("Enter Hex:", default="FFFF00").ask_async()
-            else:
-                cfg.color_hex = clr.upper()
-            cfg.use_opaque_box = await questionary.confirm("Add Background Box?", default=False, style=Q_STYLE).ask_async()
-            
-            size_opts = ["30 (Standard)", "48 (Large)", "60 (Huge)", "Custom"]
-            sz_sel = await questionary.select("Font Size:", choices=size_opts, default="48 (Large)", style=Q_STYLE).ask_async()
-            if sz_sel == "Custom":
-                raw_size = await questionary.text("Enter Size:", default="48").ask_async()
-                cfg.font_size = int(raw_size) if raw_size.isdigit() else 48
-            else:
-                cfg.font_size = int(sz_sel.split(' ')[0])
+            await ask_styling(cfg)
 
         # 4. Settings
-        cfg.resolution = await questionary.select("Output Resolution:", choices=["Original", "720p", "480p"], default="Original", style=Q_STYLE).ask_async()
-        
-        logos = list(DIRECTORIES["LOGOS"].glob("*"))
-        valid_logos = [f for f in logos if f.suffix.lower() in ('.png', '.jpg')]
-        if valid_logos:
-            wm_choices = ["None"] + [f.name for f in valid_logos]
-            wm_sel = await questionary.select("Add Watermark:", choices=wm_choices, style=Q_STYLE).ask_async()
-            if wm_sel != "None":
-                cfg.watermark_path = DIRECTORIES["LOGOS"] / wm_sel
-                cfg.watermark_pos = await questionary.select("Position:", choices=["Bottom-Right", "Top-Right", "Top-Left", "Bottom-Left", "Center"], style=Q_STYLE).ask_async()
+        await ask_output_settings(cfg)
 
         # 5. Execution
         while True:
@@ -432,13 +1053,24 @@ async def main():
             summary = (
                 f"\n[bold white]Target:[/][cyan] {escape(cfg.video_path.name)}[/]\n"
                 f"[bold white]Mode:[/][green] {cfg.mode.upper()}[/] | "
-                f"[bold white]Res:[/][cyan] {cfg.resolution}[/]"
+                f"[bold white]Res:[/][cyan] {', '.join(cfg.resolutions)}[/]"
             )
             console.print(Panel(summary, title="Job Summary", border_style="cyan"))
             
-            action = await questionary.select("Ready?", choices=["👁️  Preview (15s)", "🚀 Start Render", "🔙 Edit Settings"], style=Q_STYLE).ask_async()
+            actions = ["👁️  Preview (15s)", "🚀 Start Render", "⚡ Preview + Render (Single Pass)", "📥 Add to Queue", "🔙 Edit Settings"]
+            if queue: actions.insert(4, f"📦 Add + Render Queue ({len(queue) + 1} videos)")
+            action = await questionary.select("Ready?", choices=actions, style=Q_STYLE).ask_async()
             
-            if "Preview" in action:
+            if "Queue" in action:
+                final = queue.add(cfg)
+                if "Render Queue" in action: await queue.run()
+                else: console.print(f"[dim]Queued {escape(cfg.video_path.name)} -> {escape(final.name)} ({len(queue)} waiting). The queue renders when you stop adding videos.[/]")
+                break
+            elif "Single Pass" in action:
+                proc = MediaProcessor(cfg)
+                await proc.run_batched([proc._output_for(True)], [proc._output_for(False)])
+                break
+            elif "Preview" in action:
                 cfg.is_preview = True
                 await MediaProcessor(cfg).run()
                 cfg.is_preview = False
@@ -452,6 +1084,8 @@ async def main():
         if not await questionary.confirm("Process another video?", default=False, style=Q_STYLE).ask_async():
             break
 
+    if queue: await queue.run()
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())